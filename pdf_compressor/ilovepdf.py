@@ -5,13 +5,63 @@ https://github.com/AndyCyberSec/pylovepdf
 
 from __future__ import annotations
 
+import base64
+import hashlib
 import json
 import os
+import shutil
 import tempfile
-from typing import Any, BinaryIO, Literal, TypedDict
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http import HTTPStatus
+from importlib.metadata import PackageNotFoundError, version
+from typing import TYPE_CHECKING, Any, BinaryIO, Literal, TypedDict, TypeVar
 
 import requests
 from requests import Response
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from pdf_compressor.utils import cache_dir
+
+if TYPE_CHECKING:
+    from urllib3.response import BaseHTTPResponse
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads  # type: ignore[assignment,unused-ignore]
+
+try:
+    from requests_toolbelt import MultipartEncoder
+except ImportError:
+    MultipartEncoder = None  # uploads fall back to requests' in-memory multipart body
+
+try:
+    USER_AGENT = f"pdf-compressor/{version('pdf-compressor')}"
+except PackageNotFoundError:
+    USER_AGENT = "pdf-compressor"  # package not installed
+
+# only reuse cached auth tokens that stay valid for at least this many seconds. Must
+# exceed the duration of a long batch upload since 401s on file uploads aren't
+# retried with a new token (their body can't be replayed).
+TOKEN_EXPIRY_MARGIN = 15 * 60
+
+# longest a rate-limited or unavailable server can make us wait between retries
+MAX_RETRY_AFTER = 5
+
+T = TypeVar("T", bound="ILovePDF")
+
+
+class _CappedRetry(Retry):
+    """Retry that honors Retry-After headers of 429 and 503 responses but waits at
+    most MAX_RETRY_AFTER seconds so a server can't block the CLI for arbitrarily long.
+    """
+
+    def get_retry_after(self, response: BaseHTTPResponse) -> float | None:
+        """Seconds to wait before retrying as requested by the server, capped."""
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, MAX_RETRY_AFTER)
 
 
 class ProcessResponse(TypedDict):
@@ -29,7 +79,9 @@ class ProcessResponse(TypedDict):
 class ILovePDF:
     """Communicates with the iLovePDF API."""
 
-    def __init__(self, public_key: str, *, debug: bool = False) -> None:
+    def __init__(
+        self, public_key: str, *, debug: bool = False, max_connections: int = 16
+    ) -> None:
         """Creates a new iLovePDF object to interact with the API.
 
         Args:
@@ -37,38 +89,109 @@ class ILovePDF:
                 https://developer.ilovepdf.com/signup.
             debug (bool, optional): Whether to perform real API requests (consumes
                 quota) or just report what would happen. Defaults to False.
+            max_connections (int, optional): Max number of open connections kept per
+                host. Should be at least the number of concurrent requests. Defaults
+                to 16.
         """
         self.public_key = public_key
 
         self.api_version = "v1"
         self.start_server = "api.ilovepdf.com"
         self.working_server = ""
+        # requests go to start_server until a task is assigned a working server
+        self._base_url = f"https://{self.start_server}/{self.api_version}/"
         # Any resource can be called with a debug option. When true, iLovePDF won't
         # process the request but will output the parameters received by the server.
         self.debug = debug  # https://developer.ilovepdf.com/docs/api-reference#testing
 
-        # header will contain authorization token to be sent with every task
-        self.headers: dict[str, str] | None = None
+        # share one session (and hence connection pool) across all API calls so
+        # repeated and concurrent requests reuse open TLS connections. Only
+        # idempotent requests (GET, DELETE) are retried on transient server
+        # errors and rate limiting (429), waiting as long as Retry-After headers ask
+        # (up to MAX_RETRY_AFTER seconds). Once retries are used up, the last
+        # response is returned (instead of raising RetryError) so _send_request()
+        # can report its status and text.
+        self._session = requests.Session()
+        retries = _CappedRetry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=16, pool_maxsize=max_connections, max_retries=retries
+        )
+        self._session.mount("https://", adapter)
+        # session headers will also contain the authorization token after self.auth()
+        self._session.headers["User-Agent"] = USER_AGENT
+        # last fetched quota and time.monotonic() timestamp of when it was fetched
+        self._quota_cache: tuple[int, float] | None = None
 
         self.auth()
 
-    def auth(self) -> None:
-        """Get iLovePDF API session token."""
+    def auth(self, *, use_cache: bool = True) -> None:
+        """Get iLovePDF API session token. Tokens are cached on disk and reused by
+        later ILovePDF instances with the same public key until shortly before they
+        expire, saving one API round-trip per instance.
+
+        Args:
+            use_cache (bool, optional): Whether to reuse a cached token if available.
+                Defaults to True.
+        """
+        cache_path = self._token_cache_path()
+
+        if use_cache and (token := _read_cached_token(cache_path)):
+            self._session.headers["Authorization"] = f"Bearer {token}"
+            return
+
+        # don't send a stale (possibly revoked) token along with the auth request
+        self._session.headers.pop("Authorization", None)
         payload = {"public_key": self.public_key}
 
         response = self._send_request("post", endpoint="auth", payload=payload)
+        token = _parse_json(response)["token"]
+
+        self._session.headers["Authorization"] = f"Bearer {token}"
+        _write_cached_token(cache_path, token)
 
-        self.headers = {"Authorization": f"Bearer {response.json()['token']}"}
+    def _token_cache_path(self) -> str:
+        """Path of the file caching the auth token for this instance's public key."""
+        key_hash = hashlib.sha256(self.public_key.encode()).hexdigest()[:16]
+        return os.path.join(cache_dir(), f"token-{key_hash}.json")
 
-    def get_quota(self) -> int:
+    def get_quota(self, *, max_age: float = 60) -> int:
         """Get the number of remaining files that can be processed by the API in the
         current billing cycle.
 
         Response has only one key: {'remaining_files': int}.
+
+        Args:
+            max_age (float, optional): Reuse the previously fetched quota if it's at
+                most this many seconds old. Set to 0 to always query the API.
+                Defaults to 60.
         """
-        response = json.loads(self._send_request("get", "info").text)
+        if self._quota_cache and time.monotonic() - self._quota_cache[1] < max_age:
+            return self._quota_cache[0]
+
+        response = _parse_json(
+            self._send_request("get", "info", server=self.start_server)
+        )
+        remaining_files = response["remaining_files"]
+        self._quota_cache = (remaining_files, time.monotonic())
+
+        return remaining_files
+
+    def close(self) -> None:
+        """Close the underlying HTTP session and release its pooled connections."""
+        self._session.close()
+
+    def __enter__(self: T) -> T:
+        """Allow using clients as context managers, e.g. with Compress(...) as task."""
+        return self
 
-        return response["remaining_files"]
+    def __exit__(self, *exc_info: object) -> None:
+        """Close the HTTP session on exiting the with block, even on errors."""
+        self.close()
 
     def _send_request(
         self,
@@ -76,23 +199,65 @@ class ILovePDF:
         endpoint: str,
         *,
         payload: dict[str, Any] | None = None,
+        json_payload: dict[str, Any] | None = None,
         files: dict[str, BinaryIO] | None = None,
         stream: bool = False,
+        retry_auth: bool = True,
+        server: str = "",
     ) -> Response:
-        # continue to use old server if task was already assigned one, else connect to
-        # new server
-        server = self.working_server or self.start_server
         payload = payload or {}
-
-        url = f"https://{server}/{self.api_version}/{endpoint}"
+        # unless told otherwise, send to the task's working server once assigned one
+        if server:
+            url = f"https://{server}/{self.api_version}/{endpoint}"
+        else:
+            url = self._base_url + endpoint
 
         if self.debug:
-            payload["debug"] = True
-
-        response = getattr(requests, method)(
-            url, data=payload, headers=self.headers, files=files, stream=stream
+            (payload if json_payload is None else json_payload)["debug"] = True
+
+        # requests with file uploads can't be replayed since their body gets consumed
+        can_retry = retry_auth and not files
+        headers = None
+        data: dict[str, Any] | MultipartEncoder = payload
+        if files and MultipartEncoder is not None:
+            # requests reads files fully into memory to build a multipart body,
+            # MultipartEncoder instead streams them from disk in small chunks
+            fields: dict[str, str | tuple[str, BinaryIO]] = {
+                key: str(val) for key, val in payload.items()
+            }
+            for key, file in files.items():
+                fields[key] = (os.path.basename(file.name), file)
+            data = MultipartEncoder(fields=fields)
+            headers = {"Content-Type": data.content_type}
+            files = None
+
+        response = self._session.request(
+            method,
+            url,
+            data=data,
+            json=json_payload,
+            headers=headers,
+            files=files,
+            stream=stream,
         )
 
+        if (
+            response.status_code == HTTPStatus.UNAUTHORIZED
+            and endpoint != "auth"
+            and can_retry
+        ):
+            # cached token was rejected (e.g. revoked), fetch a new one and retry once
+            self.auth(use_cache=False)
+            return self._send_request(
+                method,
+                endpoint,
+                payload=payload,
+                json_payload=json_payload,
+                stream=stream,
+                retry_auth=False,
+                server=server,
+            )
+
         if not response.ok:
             raise ValueError(
                 f"Error: {response.url} returned status code {response.status_code}, "
@@ -102,6 +267,85 @@ class ILovePDF:
         return response
 
 
+def _parse_json(response: Response) -> Any:
+    """Decode a JSON API response. Uses orjson if installed which parses the raw
+    response bytes directly, skipping the intermediate str decoding of
+    response.json().
+
+    Args:
+        response (Response): API response with JSON body.
+
+    Returns:
+        Any: Decoded JSON.
+    """
+    return json_loads(response.content)
+
+
+def _jwt_expiry(token: str) -> float:
+    """Read the expiry timestamp (exp claim) of a JWT without verifying it.
+
+    Args:
+        token (str): JSON Web Token as returned by the iLovePDF auth endpoint.
+
+    Returns:
+        float: Unix timestamp at which the token expires. 0 if it can't be decoded.
+    """
+    try:
+        claims = token.split(".")[1]
+        claims += "=" * (-len(claims) % 4)  # restore stripped base64 padding
+        return float(json.loads(base64.urlsafe_b64decode(claims))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return 0
+
+
+def _read_cached_token(cache_path: str) -> str | None:
+    """Load an auth token from disk if it exists and isn't about to expire.
+
+    Args:
+        cache_path (str): Path to the JSON file written by _write_cached_token().
+
+    Returns:
+        str | None: Cached token or None if missing, unreadable or (nearly) expired.
+    """
+    try:
+        with open(cache_path, encoding="utf8") as file:
+            cached = json.load(file)
+        token, expiry = cached["token"], cached["exp"]
+        # TypeError for corrupted or hand-edited caches, e.g. {"exp": "123"}
+        if expiry - time.time() < TOKEN_EXPIRY_MARGIN:
+            return None
+    except (OSError, KeyError, TypeError, ValueError):
+        return None
+
+    return token
+
+
+def _write_cached_token(cache_path: str, token: str) -> None:
+    """Save an auth token and its expiry to disk, readable only by the current user.
+    Caching is best-effort, failures to write are silently ignored.
+
+    Args:
+        cache_path (str): Path of the JSON file to write.
+        token (str): JSON Web Token to cache.
+    """
+    if not (expiry := _jwt_expiry(token)):
+        return  # can't tell when token expires, so don't reuse it
+
+    tmp_path = ""
+    try:
+        dir_name = os.path.dirname(cache_path)
+        os.makedirs(dir_name, exist_ok=True)
+        # write to a private (mode 0o600) temp file and atomically move it in place so
+        # concurrent pdf-compressor runs never read a partially written token
+        fd, tmp_path = tempfile.mkstemp(dir=dir_name, prefix=".token-")
+        with os.fdopen(fd, "w", encoding="utf8") as file:
+            json.dump({"token": token, "exp": expiry}, file)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        if tmp_path and os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+
+
 class Task(ILovePDF):
     """Class for interacting with the iLovePDF request workflow.
 
@@ -115,6 +359,7 @@ class Task(ILovePDF):
         *,
         verbose: bool = False,
         password: str = "",
+        upload_workers: int = 4,
         **kwargs: Any,
     ) -> None:
         """Creates a new task object to interact with the API.
@@ -130,17 +375,25 @@ class Task(ILovePDF):
                 and processing files. Defaults to False.
             password (str, optional): Password to open PDFs in case they have one.
                 Defaults to "".
+            upload_workers (int, optional): Max number of files to upload to iLovePDF
+                concurrently. Defaults to 4.
             **kwargs: Additional keyword arguments to pass to ILovePDF.__init__().
         """
+        if upload_workers < 1:
+            raise ValueError(f"upload_workers must be at least 1, got {upload_workers}")
+        # connection pool must fit all concurrent uploads to avoid discarding sockets
+        kwargs.setdefault("max_connections", max(16, upload_workers))
         super().__init__(public_key, **kwargs)
 
         self.files: dict[str, str] = {}
         self._task_id = ""
         self._process_response: ProcessResponse | None = None
+        self._process_future: Future[ProcessResponse] | None = None
 
         self.verbose = verbose
         self.tool = tool
         self.password = password
+        self.upload_workers = upload_workers
 
         # API options https://developer.ilovepdf.com/docs/api-reference#process
         # placeholders like {app}, {n}, {filename} in output/packaged_filename will be
@@ -149,8 +402,8 @@ class Task(ILovePDF):
         self.process_params = {
             "tool": tool,
             "ignore_password": True,
-            # important to keep {n} in front as sort order is used to match existing
-            # to downloaded files
+            # important to keep {n} first as del_or_keep_compressed() parses the
+            # index of the uploaded file from the ZIP member name before the first -
             "output_filename": "{n}-{filename}-{app}",
             "packaged_filename": "{app}ed-PDFs",
         }
@@ -161,10 +414,12 @@ class Task(ILovePDF):
         """Initiate contact with iLovePDF API to get assigned a working server that will
         handle ensuing requests.
         """
-        response = self._send_request("get", f"start/{self.tool}").json()
+        response = _parse_json(self._send_request("get", f"start/{self.tool}"))
 
         if response:
             self.working_server = response["server"]
+            # all further requests of this task go to the assigned working server
+            self._base_url = f"https://{self.working_server}/{self.api_version}/"
 
             self._task_id = response["task"]
 
@@ -199,42 +454,77 @@ class Task(ILovePDF):
             dict[str, str]: Map from local filenames to corresponding filenames on the
                 server.
         """
-        payload = {"task": self._task_id}
+        if not self.files:
+            return self.files
 
-        for filename in self.files:
-            with open(filename, "rb") as file:
-                response = self._send_request(
-                    "post", "upload", payload=payload, files={"file": file}
-                ).json()
+        n_workers = min(self.upload_workers, len(self.files))
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(self._upload_one, list(self.files)))
 
-            # server_filename is the only key in the JSON response
-            self.files[filename] = response["server_filename"]
+        # only write back to self.files once all uploads have completed
+        self.files.update(results)
 
         return self.files
 
+    def _upload_one(self, filename: str) -> tuple[str, str]:
+        """Upload a single file to this task's working server.
+
+        Args:
+            filename (str): Path of local file to upload.
+
+        Returns:
+            tuple[str, str]: Local filename and corresponding filename on the server.
+        """
+        payload = {"task": self._task_id}
+
+        with open(filename, "rb") as file:
+            response = _parse_json(
+                self._send_request(
+                    "post", "upload", payload=payload, files={"file": file}
+                )
+            )
+
+        # server_filename is the only key in the JSON response
+        return filename, response["server_filename"]
+
     def process(self) -> ProcessResponse:
         """Uploads and then processes files added to this Task. Files will be processed
         in the same order as iterating over self.files.items().
 
+        Raises:
+            ValueError: If the API key's remaining quota is too small to process all
+                files. Checked before uploading anything to not waste bandwidth.
+
         Returns:
             ProcessResponse: The post-processing JSON response.
         """
+        # debug requests don't consume quota
+        if not self.debug and len(self.files) > (quota := self.get_quota()):
+            raise ValueError(
+                f"Can't process {len(self.files):,} files, only {quota:,} remaining in "
+                "this billing cycle"
+            )
+
         if self.verbose:
             print("Uploading file(s)...")
 
         self.upload()
 
-        payload = self.process_params.copy()
-        payload["task"] = self._task_id
+        files = [
+            {"filename": filename, "server_filename": server_filename}
+            for filename, server_filename in self.files.items()
+        ]
+        if self.password:  # only send passwords if one was set
+            for file in files:
+                file["password"] = self.password
 
-        for idx, (filename, server_filename) in enumerate(self.files.items()):
-            payload[f"files[{idx}][filename]"] = filename
-            payload[f"files[{idx}][server_filename]"] = server_filename
-            payload[f"files[{idx}][password]"] = self.password
+        # send as JSON to serialize the file list in a single pass and avoid the
+        # overhead of url-encoding 2-3 form fields per file
+        payload = {**self.process_params, "task": self._task_id, "files": files}
 
-        response: ProcessResponse = self._send_request(
-            "post", "process", payload=payload
-        ).json()
+        response: ProcessResponse = _parse_json(
+            self._send_request("post", "process", json_payload=payload)
+        )
 
         self._process_response = response
         n_files = response["output_filenumber"]
@@ -245,11 +535,50 @@ class Task(ILovePDF):
                 f" for processing, but only {n_files} were downloaded from server."
             )
 
+        if self._quota_cache:  # processed files count against the quota
+            remaining_files, fetched_at = self._quota_cache
+            self._quota_cache = (remaining_files - n_files, fetched_at)
+
         if self.verbose:
             print(f"File(s) uploaded and processed!\n{response = }")
 
         return response
 
+    def submit(self) -> Future[ProcessResponse]:
+        """Like task.process() but returns immediately, uploading and processing files
+        in a background thread. Lets callers prepare other tasks or do local work while
+        iLovePDF is busy instead of blocking on the upload and process requests.
+
+        Returns:
+            Future[ProcessResponse]: Resolves to the post-processing JSON response.
+                Use task.wait() to block until it's available.
+        """
+        executor = ThreadPoolExecutor(max_workers=1)
+        self._process_future = executor.submit(self.process)
+        # worker thread exits once process() returns, no need to join it here
+        executor.shutdown(wait=False)
+
+        return self._process_future
+
+    def wait(self, timeout: float | None = None) -> ProcessResponse:
+        """Block until files submitted with task.submit() have been processed.
+
+        Args:
+            timeout (float, optional): Max number of seconds to wait. Defaults to None
+                meaning wait indefinitely.
+
+        Raises:
+            ValueError: If task.submit() wasn't called first.
+            TimeoutError: If processing didn't finish within timeout seconds.
+
+        Returns:
+            ProcessResponse: The post-processing JSON response.
+        """
+        if self._process_future is None:
+            raise ValueError("No submitted files to wait for, call task.submit() first")
+
+        return self._process_future.result(timeout=timeout)
+
     def download(self, save_to_dir: str | None = None) -> str:
         """Download this task's output file(s) for the given task. Should not be called
         until after task.process(). In case of a single output file, it is saved to disk
@@ -267,10 +596,6 @@ class Task(ILovePDF):
                 "You called task.download() but there are no files to download"
             )
 
-        endpoint = f"download/{self._task_id}"
-
-        response = self._send_request("get", endpoint, stream=True)
-
         if not save_to_dir:  # save_to_dir is None or ''
             save_to_dir = tempfile.mkdtemp()
 
@@ -282,9 +607,22 @@ class Task(ILovePDF):
         # may contain subdirs)
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
-        # response.content is PDF file or ZIP archive, either way, we save as binary
-        with open(file_path, "wb") as file:
-            file.write(response.content)
+        response = self._send_request("get", f"download/{self._task_id}", stream=True)
+
+        # response body is PDF file or ZIP archive, either way, we save as binary.
+        # Copy it to disk in 1 MiB chunks instead of buffering it all in memory.
+        # Write to a .part file and move it in place once complete so interrupted
+        # downloads never leave a truncated file at file_path.
+        part_path = f"{file_path}.part"
+        try:
+            response.raw.decode_content = True
+            with open(part_path, "wb") as file:
+                shutil.copyfileobj(response.raw, file, length=1 << 20)
+            os.replace(part_path, file_path)
+        finally:
+            response.close()
+            if os.path.isfile(part_path):
+                os.remove(part_path)
 
         return file_path
 
@@ -315,6 +653,8 @@ class Compress(Task):
         task.delete_current_task()
     """
 
+    VALID_LEVELS = frozenset({"low", "recommended", "extreme"})
+
     def __init__(
         self, public_key: str, compression_level: str = "recommended", **kwargs: Any
     ) -> None:
@@ -327,11 +667,13 @@ class Compress(Task):
                 'extreme' noticeably degrades image quality. Defaults to 'recommended'.
             **kwargs: Additional keyword arguments to pass to Task.__init__().
         """
-        super().__init__(public_key, tool="compress", **kwargs)
-
-        if compression_level not in (valid_levels := ("low", "recommended", "extreme")):
+        # validate before Task.__init__() to fail without any API requests
+        if compression_level not in self.VALID_LEVELS:
             raise ValueError(
-                f"Invalid {compression_level=}, must be one of {valid_levels}"
+                f"Invalid {compression_level=}, must be one of "
+                f"{sorted(self.VALID_LEVELS)}"
             )
 
+        super().__init__(public_key, tool="compress", **kwargs)
+
         self.process_params["compression_level"] = compression_level
@@ -1,19 +1,22 @@
 from __future__ import annotations
 
+import hashlib
 import os
-import re
-from argparse import ArgumentParser
-from glob import glob
+from argparse import ArgumentParser, ArgumentTypeError
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from importlib.metadata import version
 from typing import TYPE_CHECKING, Any
 
 from pdf_compressor.ilovepdf import Compress, ILovePDF
-from pdf_compressor.utils import ROOT, del_or_keep_compressed, load_dotenv
+from pdf_compressor.utils import ROOT, del_or_keep_compressed, load_dotenv, write_stats
 
 if TYPE_CHECKING:
     from collections.abc import Sequence
 
 DEFAULT_SUFFIX = "-compressed"
+# file extensions (lower case) recognized as PDFs
+PDF_EXTS = (".pdf", ".pdfa", ".pdfx")
 API_KEY_KEY = "ILOVEPDF_PUBLIC_KEY"
 MISSING_API_KEY_ERR = KeyError(
     "pdf-compressor needs an iLovePDF public key to access its API. Set one "
@@ -22,8 +25,33 @@ MISSING_API_KEY_ERR = KeyError(
 )
 
 
-def main(argv: Sequence[str] | None = None) -> int:
-    """Compress PDFs using iLovePDF's API."""
+def _positive_int(value: str) -> int:
+    """Parse a CLI argument that must be a positive integer.
+
+    Args:
+        value (str): Raw argument value.
+
+    Raises:
+        ArgumentTypeError: If value is not an integer > 0, so argparse prints a
+            usage error.
+
+    Returns:
+        int: Parsed value.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise ArgumentTypeError(f"must be a positive integer, got {value!r}")
+    return number
+
+
+@lru_cache(maxsize=1)
+def _build_parser() -> ArgumentParser:
+    """Build the pdf-compressor CLI parser. Cached since main() may be called many
+    times in one process (e.g. in tests or when used as a library).
+    """
     parser = ArgumentParser(
         description="Batch compress PDFs on the command line. Powered by iLovePDF.com.",
         allow_abbrev=False,
@@ -79,7 +107,7 @@ def main(argv: Sequence[str] | None = None) -> int:
     parser.add_argument(
         "--compression-level",
         "--cl",
-        choices=("low", "recommended", "extreme"),
+        choices=sorted(Compress.VALID_LEVELS),
         default="recommended",
         help="How hard to squeeze the file size. 'extreme' noticeably degrades image "
         "quality. Defaults to 'recommended'.",
@@ -97,6 +125,14 @@ def main(argv: Sequence[str] | None = None) -> int:
         "reduction, the compressed file will be discarded.",
     )
 
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=_positive_int,
+        default=4,
+        help="Max number of PDFs to upload to iLovePDF concurrently. Defaults to 4.",
+    )
+
     parser.add_argument(
         "--debug",
         action="store_true",
@@ -134,15 +170,22 @@ def main(argv: Sequence[str] | None = None) -> int:
         "--write-stats-path",
         type=str,
         default="",
-        help="File path to write a CSV, Excel or other pandas supported file format "
-        "with original vs compressed file sizes and actions taken on each input file",
+        help="File path to write a CSV, JSON, Excel or HTML file with original vs "
+        "compressed file sizes and actions taken on each input file. Excel and HTML "
+        "require pandas.",
     )
 
     pkg_version = version(pkg_name := "pdf-compressor")
     parser.add_argument(
         "-v", "--version", action="version", version=f"{pkg_name} v{pkg_version}"
     )
-    args = parser.parse_args(argv)
+
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Compress PDFs using iLovePDF's API."""
+    args = _build_parser().parse_args(argv)
 
     if new_key := args.set_api_key:
         if not new_key.startswith("project_public_"):
@@ -152,15 +195,17 @@ def main(argv: Sequence[str] | None = None) -> int:
 
         with open(f"{ROOT}/.env", "w+", encoding="utf8") as file:
             file.write(f"ILOVEPDF_PUBLIC_KEY={new_key}\n")
+        _load_dotenv_once.cache_clear()  # pick up new key on next _api_key() call
 
         return 0
 
-    load_dotenv()
-    if not (api_key := os.environ[API_KEY_KEY]):
-        raise MISSING_API_KEY_ERR
+    api_key = _api_key()
 
     if args.report_quota:
-        remaining_files = ILovePDF(api_key).get_quota()
+        # plain ILovePDF client (not a Task) so no task server is started just to
+        # read the quota: with a cached auth token this is a single GET info request
+        with ILovePDF(api_key) as client:
+            remaining_files = client.get_quota()
 
         print(f"Remaining files in this billing cycle: {remaining_files:,}")
 
@@ -183,6 +228,7 @@ def compress(
     on_bad_files: str = "error",
     write_stats_path: str = "",
     password: str = "",
+    jobs: int = 4,
     **kwargs: Any,  # noqa: ARG001
 ) -> int:
     """Compress PDFs using iLovePDF's API.
@@ -202,12 +248,14 @@ def compress(
         on_no_files (str): What to do when no input PDFs received.
         on_bad_files (str): How to behave when receiving input files that don't appear
             to be PDFs.
-        write_stats_path (str): File path to write a CSV, Excel or other pandas
-            supported file format with original vs compressed file sizes and actions
-            taken on each input file
+        write_stats_path (str): File path to write a CSV, JSON, Excel or HTML file
+            with original vs compressed file sizes and actions taken on each input
+            file. Excel and HTML require pandas.
         password (str): Password to open PDFs in case they have one. Defaults to "".
             TODO There's currently no way of passing different passwords for different
             files. PDFs with different passwords must be compressed one by one.
+        jobs (int): Max number of PDFs to upload to iLovePDF concurrently.
+            Defaults to 4.
         **kwargs: Additional keywords are ignored.
 
     Returns:
@@ -216,9 +264,7 @@ def compress(
     if min_size_reduction is None:
         min_size_reduction = 10 if inplace else 0
 
-    load_dotenv()
-    if not (api_key := os.environ[API_KEY_KEY]):
-        raise MISSING_API_KEY_ERR
+    api_key = _api_key()
 
     if not (inplace or suffix):
         raise ValueError(
@@ -226,19 +272,35 @@ def compress(
             " non-empty suffix to append to the name of compressed files."
         )
 
-    # use set() to ensure no duplicate files
-    uniq_files: list[str] = sorted({fn.replace("\\", "/").strip() for fn in filenames})
-    # for each directory received glob for all PDFs in it
-    file_paths = []
-    for file_path in uniq_files:
-        if os.path.isdir(file_path):
-            file_paths += glob(os.path.join(file_path, "**", "*.pdf*"), recursive=True)
+    # drop duplicate files while keeping the order in which they were passed
+    uniq_files = list(dict.fromkeys(fn.replace("\\", "/").strip() for fn in filenames))
+    # replace each directory received with all PDFs in it. Multiple directories are
+    # walked concurrently since listing large trees is I/O-bound (GIL is released).
+    # Plain files (usually the vast majority, e.g. from shell globs) skip the pool.
+    dirs = [path for path in uniq_files if os.path.isdir(path)]
+    if len(dirs) > 1:
+        with ThreadPoolExecutor() as executor:
+            pdfs_by_dir = dict(zip(dirs, executor.map(_expand_dir, dirs)))
+    else:
+        pdfs_by_dir = {path: _expand_dir(path) for path in dirs}
+    file_paths = [
+        path
+        for file_path in uniq_files
+        for path in pdfs_by_dir.get(file_path, [file_path])
+    ]
+
+    # split into PDFs and other files in a single pass, matching files case
+    # insensitively ending with .pdf(,a,x) and possible white space
+    # PDFs are keyed by realpath to drop ones passed both directly and via their
+    # directory (or through symlinks) so they're not compressed twice
+    pdfs_by_realpath: dict[str, str] = {}
+    not_pdf_paths: list[str] = []
+    for path in file_paths:
+        if path.rstrip().lower().endswith(PDF_EXTS):
+            pdfs_by_realpath.setdefault(os.path.realpath(path), path)
         else:
-            file_paths += [file_path]
-
-    # match files case insensitively ending with .pdf(,a,x) and possible white space
-    pdf_paths = [f for f in file_paths if re.match(r".*\.pdf[ax]?\s*$", f.lower())]
-    not_pdf_paths = {*file_paths} - {*pdf_paths}
+            not_pdf_paths += [path]
+    pdf_paths = list(pdfs_by_realpath.values())
 
     if on_bad_files == "error" and len(not_pdf_paths) > 0:
         raise ValueError(
@@ -262,54 +324,177 @@ def compress(
             raise ValueError("No input files provided")
         return 0
 
-    task = Compress(
-        api_key, compression_level=compression_level, debug=debug, password=password
-    )
-    task.verbose = verbose
+    # upload identical PDFs (e.g. from overlapping directories) only once
+    upload_paths, duplicates = _group_duplicates(pdf_paths)
+    if verbose and (n_dupes := len(pdf_paths) - len(upload_paths)) > 0:
+        print(f"Skipping upload of {n_dupes:,} PDFs identical to other input files")
+
+    with Compress(
+        api_key,
+        compression_level=compression_level,
+        debug=debug,
+        password=password,
+        upload_workers=jobs,
+    ) as task:
+        task.verbose = verbose
 
-    for pdf in pdf_paths:
-        task.add_file(pdf)
+        for pdf in upload_paths:
+            task.add_file(pdf)
 
-    task.process()
+        task.process()
 
-    downloaded_file = task.download(save_to_dir=outdir)
+        downloaded_file = task.download(save_to_dir=outdir)
 
-    task.delete_current_task()
+        task.delete_current_task()
 
     min_size_red = min_size_reduction or (10 if inplace else 0)
 
+    stats: dict[str, dict[str, object]] = {}
     if not debug:
         stats = del_or_keep_compressed(
-            pdf_paths,
+            upload_paths,
             downloaded_file,
+            duplicates=duplicates,
             inplace=inplace,
             suffix=suffix,
             min_size_reduction=min_size_red,
             verbose=verbose,
         )
 
-    if write_stats_path:
-        try:
-            import pandas as pd  # noqa: PLC0415
-        except ImportError:
-            err_msg = "To write stats to file, install pandas: pip install pandas"
-            raise ImportError(err_msg) from None
-
-        df_stats = pd.DataFrame(stats).T
-        df_stats.index.name = "file"
-        stats_path_lower = write_stats_path.strip().lower()
-
-        if ".csv" in stats_path_lower:
-            df_stats.to_csv(write_stats_path, float_format="%.4f")
-        elif ".xlsx" in stats_path_lower or ".xls" in stats_path_lower:
-            df_stats.to_excel(write_stats_path, float_format="%.4f")
-        elif ".json" in stats_path_lower:
-            df_stats.to_json(write_stats_path)
-        elif ".html" in stats_path_lower:
-            df_stats.to_html(write_stats_path, float_format="%.4f")
+    # debug runs don't process any files so there are no stats to write
+    if write_stats_path and stats:
+        write_stats(stats, write_stats_path)
 
     return 0
 
 
+@lru_cache(maxsize=1)
+def _load_dotenv_once() -> None:
+    """Parse .env into os.environ only once per process instead of on every call to
+    main() or compress().
+    """
+    load_dotenv()
+
+
+def _api_key() -> str:
+    """Get the iLovePDF public key from .env or the environment.
+
+    Raises:
+        KeyError: If no API key is set.
+
+    Returns:
+        str: iLovePDF public API key.
+    """
+    _load_dotenv_once()
+    if not (api_key := os.environ.get(API_KEY_KEY)):
+        raise MISSING_API_KEY_ERR
+
+    return api_key
+
+
+def _expand_dir(path: str) -> list[str]:
+    """Recursively find all PDFs in a directory. Like glob, hidden files and
+    directories are skipped and symlinked directories are followed (each target
+    only once, so symlink loops terminate). Paths that aren't directories are
+    returned as is.
+
+    Args:
+        path (str): File or directory path.
+
+    Returns:
+        list[str]: PDFs found in directory or [path] if path is not a directory.
+    """
+    if not os.path.isdir(path):
+        return [path]
+
+    # depth-first os.scandir() walk that filters on file extension during traversal.
+    # DirEntry caches the file type from the directory listing so there's no extra
+    # stat() per entry and non-PDFs are never turned into full paths
+    pdf_paths = []
+    dirs_to_scan = [path]
+    # real paths of the root and of symlinked directories already queued
+    seen_dirs = {os.path.realpath(path)}
+    while dirs_to_scan:
+        try:
+            entries = os.scandir(dirs_to_scan.pop())
+        except OSError:  # like glob, silently skip unreadable directories
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        dirs_to_scan += [entry.path]
+                    elif (real_path := os.path.realpath(entry.path)) not in seen_dirs:
+                        seen_dirs.add(real_path)
+                        dirs_to_scan += [entry.path]
+                # same check as for files passed directly, incl. trailing whitespace
+                elif entry.name.rstrip().lower().endswith(PDF_EXTS):
+                    pdf_paths += [entry.path]
+
+    return pdf_paths
+
+
+def _group_duplicates(
+    pdf_paths: Sequence[str],
+) -> tuple[list[str], dict[str, list[str]]]:
+    """Find input PDFs with identical content so each is only uploaded once. Only
+    files whose size matches another file's are hashed.
+
+    Args:
+        pdf_paths (list[str]): Paths to PDFs to compress.
+
+    Returns:
+        tuple[list[str], dict[str, list[str]]]: Paths with unique content (the first
+            of any set of identical files, in input order) and map from those paths to
+            the other paths with the same content.
+    """
+    paths_by_size: dict[int, list[str]] = {}
+    for path in pdf_paths:
+        try:
+            paths_by_size.setdefault(os.path.getsize(path), []).append(path)
+        except OSError:  # noqa: PERF203 (missing files reported by Task.add_file())
+            continue
+    same_size = [
+        path for paths in paths_by_size.values() if len(paths) > 1 for path in paths
+    ]
+
+    with ThreadPoolExecutor() as executor:
+        digests = dict(zip(same_size, executor.map(_file_digest, same_size)))
+
+    unique_paths: list[str] = []
+    duplicates: dict[str, list[str]] = {}
+    first_by_digest: dict[bytes, str] = {}
+    for path in pdf_paths:
+        # first file with a given digest is uploaded, later ones are duplicates of it
+        if (
+            path not in digests
+            or (first := first_by_digest.setdefault(digests[path], path)) == path
+        ):
+            unique_paths += [path]
+        else:
+            duplicates.setdefault(first, []).append(path)
+
+    return unique_paths, duplicates
+
+
+def _file_digest(path: str) -> bytes:
+    """Hash a file's content with BLAKE2b, reading it in 1 MiB chunks.
+
+    Args:
+        path (str): File path.
+
+    Returns:
+        bytes: 16-byte digest.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        while chunk := file.read(1 << 20):
+            hasher.update(chunk)
+
+    return hasher.digest()
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
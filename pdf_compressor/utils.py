@@ -1,17 +1,26 @@
 from __future__ import annotations
 
+import csv
+import json
+import math
 import os
 import shutil
 import sys
+from contextlib import nullcontext
 from os.path import abspath, basename, dirname, expanduser, getsize, isfile, splitext
-from typing import TYPE_CHECKING
+from typing import IO, TYPE_CHECKING
 from zipfile import ZipFile
 
 if TYPE_CHECKING:
-    from collections.abc import Sequence
+    from collections.abc import Mapping, Sequence
 
 ROOT = dirname(dirname(abspath(__file__)))
 
+# 1, Kilo, Mega, Giga, Tera, Peta, Exa, Zetta, Yotta
+SI_LARGE_PREFIXES = ("", "K", "M", "G", "T", "P", "E", "Z", "Y")
+# 1, milli, micro, nano, pico, femto, atto, zepto, yocto
+SI_SMALL_PREFIXES = ("", "m", "\u03bc", "n", "p", "f", "a", "z", "y")
+
 
 def si_fmt(val: float, *, binary: bool = True, fmt: str = ".1f", sep: str = "") -> str:
     """Convert large numbers into human readable format using SI prefixes in binary
@@ -36,21 +45,44 @@ def si_fmt(val: float, *, binary: bool = True, fmt: str = ".1f", sep: str = "")
     """
     factor = 1024 if binary else 1000
 
-    if abs(val) >= 1:
-        # 1, Kilo, Mega, Giga, Tera, Peta, Exa, Zetta, Yotta
-        for _scale in ("", "K", "M", "G", "T", "P", "E", "Z", "Y"):
-            if abs(val) < factor:
-                break
-            val /= factor
+    # fast path for values that need no prefix, e.g. small byte counts
+    if val == 0 or 1 <= abs(val) < factor:
+        return f"{val:{fmt}}{sep}"
+    if not math.isfinite(val):  # math.log() and math.floor() fail on inf and nan
+        return f"{val:{fmt}}{sep}"
+
+    # exponent of the largest power of factor <= abs(val) computed directly instead of
+    # dividing val by factor in a loop
+    exponent = math.floor(math.log(abs(val), factor))
+    # correct floating point error, e.g. math.log(1000, 1000) = 0.9999999999999996
+    if (scaled := abs(val) / factor**exponent) >= factor:
+        exponent += 1
+    elif scaled < 1:
+        exponent -= 1
+    # clamp to the range of available prefixes
+    exponent = max(
+        1 - len(SI_SMALL_PREFIXES), min(exponent, len(SI_LARGE_PREFIXES) - 1)
+    )
+
+    if exponent >= 0:
+        scale = SI_LARGE_PREFIXES[exponent]
     else:
-        mu_unicode = "\u03bc"
-        # milli, micro, nano, pico, femto, atto, zepto, yocto
-        for _scale in ("", "m", mu_unicode, "n", "p", "f", "a", "z", "y"):
-            if abs(val) > 1:
-                break
-            val *= factor
+        scale = SI_SMALL_PREFIXES[-exponent]
+
+    return f"{val / factor**exponent:{fmt}}{sep}{scale}"
+
 
-    return f"{val:{fmt}}{sep}{_scale}"
+def cache_dir() -> str:
+    """Get the directory for pdf-compressor's on-disk caches.
+
+    Returns:
+        str: $XDG_CACHE_HOME/pdf-compressor if set, else ~/.cache/pdf-compressor.
+    """
+    base_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        expanduser("~"), ".cache"
+    )
+
+    return os.path.join(base_dir, "pdf-compressor")
 
 
 def load_dotenv(filepath: str | None = None) -> None:
@@ -63,13 +95,19 @@ def load_dotenv(filepath: str | None = None) -> None:
         filepath = os.path.join(f"{ROOT}", ".env")
 
     if isfile(filepath):
+        env_vars = {}
         with open(filepath, encoding="utf8") as dotenv:
             for line in dotenv:
-                if line.startswith("#"):
+                if not line.strip() or line.startswith("#"):
+                    continue
+
+                # partition() splits on the first = only so values may contain =
+                key, sep, val = line.rstrip("\n").partition("=")
+                if not sep:  # skip malformed lines instead of setting key to ""
                     continue
+                env_vars[key] = val
 
-                key, val = line.replace("\n", "").split("=")
-                os.environ[key] = val
+        os.environ.update(env_vars)
 
 
 def del_or_keep_compressed(
@@ -80,6 +118,7 @@ def del_or_keep_compressed(
     suffix: str,
     min_size_reduction: int,
     verbose: bool = False,
+    duplicates: Mapping[str, Sequence[str]] | None = None,
 ) -> dict[str, dict[str, object]]:
     """Check whether compressed PDFs are smaller than original. If so, relocate each
     compressed file to same directory as the original either with suffix appended to
@@ -97,111 +136,227 @@ def del_or_keep_compressed(
             originals (in percent) for them to be kept.
         verbose (bool): Whether to print file names or full file paths. Defaults to
             False.
+        duplicates (dict[str, list[str]], optional): Map from uploaded PDFs to other
+            input files with identical content that weren't uploaded. Each is treated
+            as if it had been uploaded itself. Defaults to None.
 
     Returns:
         pd.DataFrame: Table with original and compressed file sizes.
     """
-    if (n_files := len(pdfs)) == 1:
-        compressed_files = [downloaded_file]
-    else:  # if multiple files were uploaded, downloaded_file is a ZIP archive
-        with ZipFile(downloaded_file) as archive:
-            # sort compressed_files since pdfs were also sorted
-            compressed_files = sorted(archive.namelist())
-            archive.extractall()
-
+    n_files = len(pdfs)
     total_orig_size = total_compressed_size = 0
 
     stats = {}
-
-    for idx, orig_path in enumerate(pdfs):
-        if n_files > 1:
-            compressed_path = next(
-                filename
-                for filename in compressed_files
-                if os.path.basename(filename).startswith(f"{idx}-")
-            )
-        else:
-            compressed_path = compressed_files[0]
-        orig_size = getsize(orig_path)
-        compressed_size = getsize(compressed_path)
-
-        total_orig_size += orig_size
-        total_compressed_size += compressed_size
-
-        diff = orig_size - compressed_size
-        counter = f"\n{idx + 1} " if n_files > 1 else ""
-
-        # check if size reduction is large enough to keep compressed file and
-        # optionally move original to trash if inplace=True
-        if diff / orig_size > min_size_reduction / 100:
-            filepath = orig_path if verbose else basename(orig_path)
-            print(
-                f"{counter}'{filepath}': {si_fmt(orig_size)}B -> "
-                f"{si_fmt(compressed_size)}B which is {si_fmt(diff)}B = "
-                f"{diff / orig_size:.0%} smaller."
-            )
-
-            if inplace:
-                if sys.platform == "darwin":
-                    # move original PDF to trash on macOS, for later retrieval if needed
-                    print("Old file moved to trash.")
-                    orig_file_name = os.path.split(orig_path)[1]
-
-                    trash_path = f"{expanduser('~')}/.Trash/{orig_file_name}"
-                    if isfile(trash_path):  # if file with same name already in trash,
-                        # delete it to avoid PermissionError: [Errno 1] Operation not
-                        # permitted
-                        os.remove(trash_path)
-                    os.rename(orig_path, trash_path)
-                else:
-                    # on other platforms, simply let shutil.move() below overwrite
-                    # existing PDF
-                    print("Old file deleted.")
-
-                # don't use os.(rename|replace)() on Windows, both error if src and
-                # dest are on different drives, former also if destination file already
-                # exists
-                shutil.move(compressed_path, orig_path)
-                action = "replaced original"
-
-            elif suffix:
-                base_name, ext = splitext(orig_path)
-                new_path = f"{base_name}{suffix}{ext}"
-
-                shutil.move(compressed_path, new_path)
-                action = f"saved as {basename(new_path)}"
-
+    # resolved once instead of for every file moved to the trash
+    trash_dir = os.path.join(expanduser("~"), ".Trash")
+
+    # if multiple files were uploaded, downloaded_file is a ZIP archive. Compressed
+    # PDFs are streamed from it straight to their destination instead of extracting
+    # all of them first, so files that aren't kept are never written to disk.
+    with ZipFile(downloaded_file) if n_files > 1 else nullcontext() as archive:
+        # pair each uploaded PDF with the size of its compressed version and the
+        # index of the upload it was compressed from
+        compressed_pdfs: list[tuple[str, int, int]]
+        if archive is None:
+            compressed_pdfs = [(pdfs[0], getsize(downloaded_file), 0)]
         else:
-            not_enough_reduction = "no" if diff == 0 else f"only {diff / orig_size:.1%}"
-            print(
-                f"{counter}'{orig_path}' {not_enough_reduction} smaller than original "
-                "file. Keeping original."
-            )
-            os.remove(compressed_path)
-            action = "kept original"
-
-        stats[basename(orig_path)] = {
-            "original size (B)": orig_size,
-            "compressed size (B)": compressed_size,
-            "size reduction (B)": diff,
-            "size reduction (%)": diff / orig_size,
-            "action": action,
-        }
-
-    # remove ZIP archive and unused compressed PDFs
-    for filename in (*compressed_files, downloaded_file):
-        try:
-            os.remove(filename)
-        except OSError:  # noqa: PERF203
-            pass
+            # compressed file names start with the index of the uploaded file ({n}-)
+            members = {
+                basename(info.filename).partition("-")[0]: info
+                for info in archive.infolist()
+            }
+            compressed_pdfs = [
+                (orig_path, members[str(idx)].file_size, idx)
+                for idx, orig_path in enumerate(pdfs)
+            ]
+
+        # identical inputs were only uploaded once and share their compressed version
+        for orig_path, compressed_size, upload_idx in compressed_pdfs[:n_files]:
+            compressed_pdfs += [
+                (dup_path, compressed_size, upload_idx)
+                for dup_path in (duplicates or {}).get(orig_path, ())
+            ]
+        n_pdfs = len(compressed_pdfs)
+
+        for idx, (orig_path, compressed_size, upload_idx) in enumerate(compressed_pdfs):
+            orig_size = getsize(orig_path)
+            orig_name = basename(orig_path)
+
+            total_orig_size += orig_size
+            total_compressed_size += compressed_size
+
+            diff = orig_size - compressed_size
+            counter = f"\n{idx + 1} " if n_pdfs > 1 else ""
+
+            # check if size reduction is large enough to keep compressed file and
+            # optionally move original to trash if inplace=True
+            if diff / orig_size > min_size_reduction / 100:
+                filepath = orig_path if verbose else orig_name
+                print(
+                    f"{counter}'{filepath}': {si_fmt(orig_size)}B -> "
+                    f"{si_fmt(compressed_size)}B which is {si_fmt(diff)}B = "
+                    f"{diff / orig_size:.0%} smaller."
+                )
+
+                dest = ""
+                if inplace:
+                    if sys.platform == "darwin":
+                        # move original PDF to trash on macOS, for later retrieval
+                        print("Old file moved to trash.")
+                        _move_to_trash(orig_path, trash_dir)
+                    else:
+                        # on other platforms, simply let the compressed PDF below
+                        # overwrite existing PDF
+                        print("Old file deleted.")
+
+                    dest = orig_path
+                    action = "replaced original"
+
+                elif suffix:
+                    base_name, ext = splitext(orig_path)
+                    dest = f"{base_name}{suffix}{ext}"
+                    action = f"saved as {basename(dest)}"
+
+                if dest and archive is not None:  # multiple files were uploaded
+                    with archive.open(members[str(upload_idx)]) as compressed:
+                        _save_compressed(compressed, dest)
+                elif dest and n_pdfs > 1:  # single PDF shared with duplicates
+                    with open(downloaded_file, "rb") as compressed:
+                        _save_compressed(compressed, dest)
+                elif dest:  # nothing else reads the single PDF, move it in place
+                    _move(downloaded_file, dest)
+
+            else:
+                not_enough_reduction = (
+                    "no" if diff == 0 else f"only {diff / orig_size:.1%}"
+                )
+                print(
+                    f"{counter}'{orig_path}' {not_enough_reduction} smaller than "
+                    "original file. Keeping original."
+                )
+                action = "kept original"
+
+            stats[orig_name] = {
+                "original size (B)": orig_size,
+                "compressed size (B)": compressed_size,
+                "size reduction (B)": diff,
+                "size reduction (%)": diff / orig_size,
+                "action": action,
+            }
+
+    # remove downloaded PDF or ZIP archive
+    try:
+        os.remove(downloaded_file)
+    except OSError:
+        pass
 
     # print overall size reduction if >= 2 file
     overall_reduction = total_orig_size - total_compressed_size
     show_summary_above_n_files = 2
-    if n_files > show_summary_above_n_files and overall_reduction > 0:
+    if n_pdfs > show_summary_above_n_files and overall_reduction > 0:
         print(
-            f"Overall size reduction in {n_files} files: {si_fmt(overall_reduction)}B, "
+            f"Overall size reduction in {n_pdfs} files: {si_fmt(overall_reduction)}B, "
             f"from {si_fmt(total_orig_size)}B to {si_fmt(total_compressed_size)}B"
         )
 
     return stats
+
+
+def _move_to_trash(path: str, trash_dir: str) -> None:
+    """Move a file to the macOS trash.
+
+    Args:
+        path (str): File to move.
+        trash_dir (str): Path to the trash, usually ~/.Trash.
+    """
+    trash_path = os.path.join(trash_dir, basename(path))
+    try:
+        # usually overwrites a file with the same name already in the trash
+        os.replace(path, trash_path)
+    except PermissionError:
+        # but macOS may refuse with PermissionError: [Errno 1] Operation not
+        # permitted, in which case delete the file in the trash and retry once
+        if isfile(trash_path):
+            os.remove(trash_path)
+        _move(path, trash_path)
+    except OSError:  # e.g. trash on a different volume
+        shutil.move(path, trash_path)
+
+
+def _move(src: str, dest: str) -> None:
+    """Move a file, trying a single rename before falling back to shutil.move().
+    shutil.move() copies across file systems (e.g. different drives on Windows)
+    but runs several extra checks and stat calls even when a rename would do.
+
+    Args:
+        src (str): File to move.
+        dest (str): New path of the file. Overwritten if it exists.
+    """
+    try:
+        os.replace(src, dest)
+    except OSError:
+        shutil.move(src, dest)
+
+
+def _save_compressed(src: IO[bytes], dest: str) -> None:
+    """Write a compressed PDF to dest. Data is copied to a .part file next to dest
+    which is then moved in place, so dest never holds a partially written PDF.
+    Unlike os.rename(), os.replace() overwrites existing files on all platforms and
+    since the .part file is in the same directory, it never crosses drives.
+
+    Args:
+        src (IO[bytes]): Compressed PDF (a file on disk or a ZIP archive member)
+            opened for reading.
+        dest (str): Where to save the compressed PDF.
+    """
+    part_path = f"{dest}.part"
+    try:
+        with open(part_path, "wb") as file:
+            shutil.copyfileobj(src, file, length=1 << 20)
+        os.replace(part_path, dest)
+    finally:
+        if isfile(part_path):
+            os.remove(part_path)
+
+
+def write_stats(stats: dict[str, dict[str, object]], path: str) -> None:
+    """Write compression stats to a CSV, JSON, Excel or HTML file. CSV and JSON are
+    written with the standard library, only Excel and HTML require pandas.
+
+    Args:
+        stats (dict[str, dict[str, object]]): Map from file names to their stats as
+            returned by del_or_keep_compressed().
+        path (str): File path to write. Format is inferred from the file extension.
+    """
+    path_lower = path.strip().lower()
+    columns = list(next(iter(stats.values()), {}))
+
+    if ".csv" in path_lower:
+        with open(path, "w", newline="", encoding="utf8") as file:
+            writer = csv.writer(file, lineterminator=os.linesep)
+            writer.writerow(["file", *columns])
+            writer.writerows([name, *row.values()] for name, row in stats.items())
+        return
+
+    if ".json" in path_lower:
+        # column-oriented like pandas.DataFrame.to_json()
+        json_stats = {
+            col: {name: row[col] for name, row in stats.items()} for col in columns
+        }
+        with open(path, "w", encoding="utf8") as file:
+            json.dump(json_stats, file, separators=(",", ":"))
+        return
+
+    try:
+        import pandas as pd  # noqa: PLC0415
+    except ImportError:
+        err_msg = "To write stats to Excel or HTML, install pandas: pip install pandas"
+        raise ImportError(err_msg) from None
+
+    df_stats = pd.DataFrame(stats).T
+    df_stats.index.name = "file"
+
+    if ".xlsx" in path_lower or ".xls" in path_lower:
+        df_stats.to_excel(path, float_format="%.4f")
+    elif ".html" in path_lower:
+        df_stats.to_html(path, float_format="%.4f")
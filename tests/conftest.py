@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import io
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from unittest.mock import patch
+from zipfile import ZIP_STORED, ZipFile
+
+import pytest
+from requests import Response, Session
+
+from pdf_compressor.main import API_KEY_KEY
+from pdf_compressor.utils import ROOT
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+dummy_pdf = f"{ROOT}/assets/dummy.pdf"
+
+# real API key (e.g. from a CI secret) for tests marked live_api, read before the
+# mock_ilovepdf fixture replaces it with a dummy key
+live_api_key = os.environ.get(API_KEY_KEY, "")
+
+
+class FakeILovePDF:
+    """Answers requests.Session.request() calls like the iLovePDF API would, without
+    network access. "Compressing" a PDF truncates it to compression_ratio of its size.
+    """
+
+    compression_ratio = 0.74  # matches real iLovePDF output for assets/dummy.pdf
+
+    def __init__(self) -> None:
+        """Start with no tasks and 250 remaining files."""
+        self.remaining_files = 250
+        self.task_files: dict[str, list[str]] = {}
+        self.endpoints: list[str] = []  # of all requests in the order received
+
+    def request(
+        self, _session: Session, method: str, url: str, **kwargs: Any
+    ) -> Response:
+        """Build the API's response to a request."""
+        endpoint = url.split("/v1/", 1)[1]
+        self.endpoints += [endpoint]
+        response = Response()
+        response.status_code = 200
+        response.url = url
+        body: dict[str, Any] = {}
+
+        if endpoint == "auth":
+            body = {"token": "fake-token"}
+        elif endpoint == "info":
+            body = {"remaining_files": self.remaining_files}
+        elif endpoint.startswith("start/"):
+            task_id = f"task-{len(self.task_files)}"
+            self.task_files[task_id] = []
+            body = {"server": "api-fake.ilovepdf.com", "task": task_id}
+        elif endpoint == "upload":
+            body = {"server_filename": f"upload-{os.urandom(4).hex()}.pdf"}
+        elif endpoint == "process":
+            files = [file["filename"] for file in kwargs["json"]["files"]]
+            self.task_files[kwargs["json"]["task"]] = files
+            self.remaining_files -= len(files)
+            single = len(files) == 1
+            body = {
+                "download_filename": "dummy.pdf" if single else "compressed-PDFs.zip",
+                "output_filenumber": len(files),
+            }
+        elif endpoint.startswith("download/"):
+            response.raw = io.BytesIO(self._download(endpoint.split("/", 1)[1]))
+        elif method != "delete":
+            response.status_code = 404
+
+        response._content = json.dumps(body).encode()
+        return response
+
+    def _download(self, task_id: str) -> bytes:
+        """Compressed PDF for single-file tasks, else a ZIP of all compressed PDFs."""
+        compressed = []
+        for path in self.task_files[task_id]:
+            data = Path(path).read_bytes()
+            compressed += [data[: round(len(data) * self.compression_ratio)]]
+
+        if len(compressed) == 1:
+            return compressed[0]
+
+        buffer = io.BytesIO()
+        with ZipFile(buffer, "w", compression=ZIP_STORED) as archive:
+            for idx, (path, data) in enumerate(
+                zip(self.task_files[task_id], compressed)
+            ):
+                stem = os.path.splitext(os.path.basename(path))[0]
+                archive.writestr(f"{idx}-{stem}-compress.pdf", data)
+        return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def _restore_environ() -> Iterator[None]:
+    """Undo all changes a test makes to os.environ, e.g. by loading a .env file."""
+    with patch.dict(os.environ):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def mock_ilovepdf(
+    request: pytest.FixtureRequest,
+    tmp_path_factory: pytest.TempPathFactory,
+    monkeypatch: pytest.MonkeyPatch,
+) -> Iterator[FakeILovePDF | None]:
+    """Send all iLovePDF API requests to FakeILovePDF unless a test is marked
+    live_api. Also keeps auth tokens out of the user's cache dir.
+    """
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path_factory.mktemp("cache")))
+
+    if request.node.get_closest_marker("live_api"):
+        if not live_api_key:
+            pytest.skip(f"{API_KEY_KEY} not set, can't reach iLovePDF API")
+        monkeypatch.setenv(API_KEY_KEY, live_api_key)
+        yield None
+        return
+
+    monkeypatch.setenv(API_KEY_KEY, "project_public_offline")
+    fake_api = FakeILovePDF()
+    with patch.object(Session, "request", autospec=True, side_effect=fake_api.request):
+        yield fake_api
+
+
+@pytest.fixture(scope="session")
+def dummy_pdf_bytes() -> bytes:
+    """Content of assets/dummy.pdf, read from disk only once per test session."""
+    return Path(dummy_pdf).read_bytes()
+
+
+@pytest.fixture
+def make_dummy_pdfs(tmp_path: Path, dummy_pdf_bytes: bytes) -> Callable[..., list[str]]:
+    """Factory writing copies of assets/dummy.pdf with the given names to tmp_path."""
+
+    def make(*names: str) -> list[str]:
+        paths = [f"{tmp_path}/{name}" for name in names]
+        for path in paths:
+            Path(path).write_bytes(dummy_pdf_bytes)
+        return paths
+
+    return make
+
+
+@pytest.fixture
+def dummy_pdf_path(make_dummy_pdfs: Callable[..., list[str]]) -> str:
+    """Path to a fresh copy of assets/dummy.pdf in tmp_path."""
+    return make_dummy_pdfs("dummy.pdf")[0]
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import base64
+import io
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from threading import Thread
+from typing import TYPE_CHECKING
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from pdf_compressor.ilovepdf import Compress, ILovePDF, Task
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from tests.conftest import FakeILovePDF
+
+
+def make_jwt(expiry: float) -> str:
+    """Create an unsigned JWT with the given exp claim."""
+    claims = json.dumps({"exp": expiry}).encode()
+    return f"header.{base64.urlsafe_b64encode(claims).decode().rstrip('=')}.sig"
+
+
+@pytest.fixture
+def client() -> ILovePDF:
+    """ILovePDF instance that skips authentication and never hits the network."""
+    with patch.object(ILovePDF, "auth"):
+        client = ILovePDF("project_public_dummy", debug=True)
+    client._session.request = MagicMock()  # type: ignore[method-assign]
+    return client
+
+
+def test_send_request_streams_file_uploads(
+    client: ILovePDF, dummy_pdf_path: str
+) -> None:
+    """Test file uploads are sent as a streaming multipart body."""
+    encoder_cls = pytest.importorskip("requests_toolbelt").MultipartEncoder
+
+    with open(dummy_pdf_path, "rb") as file:
+        client._send_request(
+            "post", "upload", payload={"task": "abc"}, files={"file": file}
+        )
+
+    kwargs = client._session.request.call_args.kwargs  # type: ignore[attr-defined]
+    encoder = kwargs["data"]
+    assert isinstance(encoder, encoder_cls)
+    assert kwargs["files"] is None
+    assert kwargs["headers"] == {"Content-Type": encoder.content_type}
+    assert encoder.fields["task"] == "abc"
+    assert encoder.fields["debug"] == "True"
+    assert encoder.fields["file"][0] == "dummy.pdf"
+
+
+def test_auth_token_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test auth tokens are cached on disk and only refetched once (nearly) expired."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    token = make_jwt(time.time() + 7200)
+    response = MagicMock(ok=True, status_code=200)
+    response.content = json.dumps({"token": token}).encode()
+
+    with patch("requests.Session.request", return_value=response) as mock_request:
+        ILovePDF("project_public_foo")
+        client = ILovePDF("project_public_foo")  # should be served from cache
+        assert mock_request.call_count == 1
+        assert client._session.headers["Authorization"] == f"Bearer {token}"
+
+        ILovePDF("project_public_bar")  # different key, different cache entry
+        assert mock_request.call_count == 2
+
+        # tokens expiring before a long batch upload could finish are not reused
+        response.content = json.dumps({"token": make_jwt(time.time() + 300)}).encode()
+        ILovePDF("project_public_baz")
+        ILovePDF("project_public_baz")
+        assert mock_request.call_count == 4
+
+    # tokens are written atomically to owner-only files, no temp files left behind
+    token_files = list((tmp_path / "pdf-compressor").iterdir())
+    assert len(token_files) == 3
+    assert all(path.name.startswith("token-") for path in token_files)
+    if os.name != "nt":  # Windows only reports modes 0o666 or 0o444
+        assert all(path.stat().st_mode & 0o777 == 0o600 for path in token_files)
+
+
+@pytest.mark.parametrize(
+    "content",
+    ['{"token": "x", "exp": "123"}', '{"token": "x", "exp": null}', '["x"]', "{"],
+)
+def test_auth_ignores_malformed_token_cache(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, content: str
+) -> None:
+    """Test unusable token caches trigger a new auth request instead of crashing."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    token = make_jwt(time.time() + 7200)
+    response = MagicMock(ok=True, status_code=200)
+    response.content = json.dumps({"token": token}).encode()
+
+    with patch.object(ILovePDF, "auth"):
+        cache_path = ILovePDF("project_public_foo")._token_cache_path()
+    os.makedirs(os.path.dirname(cache_path))
+    Path(cache_path).write_text(content, encoding="utf8")
+
+    with patch("requests.Session.request", return_value=response) as mock_request:
+        client = ILovePDF("project_public_foo")
+    assert mock_request.call_count == 1
+    assert client._session.headers["Authorization"] == f"Bearer {token}"
+    # malformed cache was replaced by the new token
+    assert json.loads(Path(cache_path).read_text(encoding="utf8"))["token"] == token
+
+
+def test_get_quota_cache(client: ILovePDF) -> None:
+    """Test get_quota() reuses recently fetched quota unless max_age is exceeded."""
+    response = MagicMock(ok=True, status_code=200)
+    response.content = json.dumps({"remaining_files": 250}).encode()
+    client._session.request.return_value = response  # type: ignore[attr-defined]
+
+    assert client.get_quota() == 250
+    assert client.get_quota() == 250
+    assert client._session.request.call_count == 1  # type: ignore[attr-defined]
+
+    assert client.get_quota(max_age=0) == 250
+    assert client._session.request.call_count == 2  # type: ignore[attr-defined]
+    # quota is always fetched from the start server, even after a task has started
+    url = client._session.request.call_args.args[1]  # type: ignore[attr-defined]
+    assert url == "https://api.ilovepdf.com/v1/info"
+
+
+def test_process_checks_quota_before_upload(
+    mock_ilovepdf: FakeILovePDF, make_dummy_pdfs: Callable[..., list[str]]
+) -> None:
+    """Test process() fails before uploading anything if quota is too small."""
+    mock_ilovepdf.remaining_files = 1
+    task = Compress("project_public_dummy")
+    for path in make_dummy_pdfs("a.pdf", "b.pdf"):
+        task.add_file(path)
+
+    with pytest.raises(ValueError, match="Can't process 2 files, only 1 remaining"):
+        task.process()
+    assert "upload" not in mock_ilovepdf.endpoints
+    assert "process" not in mock_ilovepdf.endpoints
+
+
+def test_process_decrements_cached_quota(
+    mock_ilovepdf: FakeILovePDF, make_dummy_pdfs: Callable[..., list[str]]
+) -> None:
+    """Test processed files are subtracted from the cached quota without refetching."""
+    task = Compress("project_public_dummy")
+    for path in make_dummy_pdfs("a.pdf", "b.pdf"):
+        task.add_file(path)
+
+    task.process()
+    n_info_requests = mock_ilovepdf.endpoints.count("info")
+    assert n_info_requests == 1  # pre-flight quota check
+
+    assert task.get_quota() == 248
+    assert mock_ilovepdf.endpoints.count("info") == n_info_requests
+
+
+def test_task_submit_wait() -> None:
+    """Test task.submit() processes files in the background and task.wait() returns
+    the result.
+    """
+    with patch.object(ILovePDF, "auth"), patch.object(Task, "start"):
+        task = Task("project_public_dummy", "compress", debug=True)
+
+    with pytest.raises(ValueError, match="call task.submit\\(\\) first"):
+        task.wait()
+
+    response = {"output_filenumber": 0}
+    with patch.object(Task, "process", return_value=response) as mock_process:
+        future = task.submit()
+        assert task.wait(timeout=5) is response
+        assert future.done()
+        mock_process.assert_called_once()
+
+
+def test_context_manager_closes_session(client: ILovePDF) -> None:
+    """Test exiting a with block closes the HTTP session, also on errors."""
+    with patch.object(client._session, "close") as mock_close:
+        with client as ctx:
+            assert ctx is client
+        assert mock_close.call_count == 1
+
+        with pytest.raises(RuntimeError, match="boom"), client:
+            raise RuntimeError("boom")
+        assert mock_close.call_count == 2
+
+
+def test_compress_invalid_level() -> None:
+    """Test invalid compression levels are rejected before any API request."""
+    with patch.object(ILovePDF, "_send_request") as mock_send_request:
+        with pytest.raises(ValueError, match="Invalid compression_level='max'"):
+            Compress("project_public_dummy", compression_level="max")
+        mock_send_request.assert_not_called()
+
+
+def test_download_is_atomic(tmp_path: Path) -> None:
+    """Test downloads only appear at their final path once fully written."""
+    with patch.object(ILovePDF, "auth"), patch.object(Task, "start"):
+        task = Task("project_public_dummy", "compress", debug=True)
+    task._process_response = {"download_filename": "out.pdf"}  # type: ignore[assignment]
+
+    response = MagicMock(raw=io.BytesIO(b"%PDF-1.7 compressed"))
+    with patch.object(Task, "_send_request", return_value=response):
+        file_path = task.download(save_to_dir=str(tmp_path))
+    assert Path(file_path).read_bytes() == b"%PDF-1.7 compressed"
+
+    # failed downloads leave neither a truncated file nor a .part file behind
+    response = MagicMock(raw=MagicMock(read=MagicMock(side_effect=OSError("reset"))))
+    mock_request = patch.object(Task, "_send_request", return_value=response)
+    with mock_request, pytest.raises(OSError, match="reset"):
+        task.download(save_to_dir=str(tmp_path / "failed"))
+    assert list((tmp_path / "failed").iterdir()) == []
+
+
+def test_retries_return_last_error_response(client: ILovePDF) -> None:
+    """Test idempotent requests are retried on 5xx but the final error response is
+    returned instead of raising RetryError, so _send_request() can report it.
+    """
+    n_requests = 0
+
+    class AlwaysUnavailable(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            nonlocal n_requests
+            n_requests += 1
+            self.send_response(503)
+            self.send_header("Retry-After", "3600")  # honored but capped
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args: object) -> None:
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), AlwaysUnavailable)
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    adapter = client._session.get_adapter("https://")
+    adapter.max_retries.backoff_factor = 0  # type: ignore[attr-defined]
+    client._session.mount("http://", adapter)
+    url = f"http://127.0.0.1:{server.server_port}/v1/info"
+    start = time.perf_counter()
+    try:
+        # send() bypasses the MagicMock replacing client._session.request
+        with patch("pdf_compressor.ilovepdf.MAX_RETRY_AFTER", 0.1):
+            response = client._session.send(requests.Request("GET", url).prepare())
+    finally:
+        server.shutdown()
+
+    assert response.status_code == 503
+    assert n_requests == 4  # 1 request + 3 retries
+    # waited MAX_RETRY_AFTER before each retry instead of 3600 s
+    assert 0.3 <= time.perf_counter() - start < 3
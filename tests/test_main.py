@@ -1,37 +1,55 @@
 from __future__ import annotations
 
+import csv
+import io
+import json
 import os
-import shutil
 import sys
 from importlib.metadata import version
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 from unittest.mock import MagicMock, patch
-from zipfile import ZipFile
+from zipfile import ZIP_STORED, ZipFile
 
-import pandas as pd
 import pytest
 from pytest import CaptureFixture
 
-from pdf_compressor import DEFAULT_SUFFIX, main
-from pdf_compressor.main import API_KEY_KEY
-from pdf_compressor.utils import load_dotenv
+from pdf_compressor import DEFAULT_SUFFIX, Compress, main
+from pdf_compressor.main import (
+    API_KEY_KEY,
+    _api_key,
+    _expand_dir,
+    _group_duplicates,
+    _load_dotenv_once,
+)
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
     from pathlib import Path
 
-dummy_pdf = "assets/dummy.pdf"
-compressed_pdf = f"dummy{DEFAULT_SUFFIX}.pdf"
+    from tests.conftest import FakeILovePDF
 
-expected_out = "'dummy.pdf': 13.0KB -> 9.6KB which is 3.4KB = 26% smaller.\n"
+pkg_name = "pdf-compressor"
+pkg_version = version(pkg_name)
 
+compressed_pdf = f"dummy{DEFAULT_SUFFIX}.pdf"
 
-def test_main_batch_compress(tmp_path: Path, capsys: CaptureFixture[str]) -> None:
+expected_out = "'dummy.pdf': 13.0KB -> 9.6KB which is 3.4KB = 26% smaller.\n"
+expected_batch_out = f"\n1 {expected_out}\n2 {expected_out.replace('dummy', 'dummy2')}"
+# originals are moved to the trash on macOS, overwritten elsewhere
+expected_inplace_out = expected_out + (
+    "Old file moved to trash.\n" if sys.platform == "darwin" else "Old file deleted.\n"
+)
+
+
+def test_main_batch_compress(
+    tmp_path: Path,
+    capsys: CaptureFixture[str],
+    make_dummy_pdfs: Callable[..., list[str]],
+    mock_ilovepdf: FakeILovePDF,
+) -> None:
     """Test standard main() invocation batch-compressing 2 PDFs at once."""
     # include path sep to test https://github.com/janosh/pdf-compressor/issues/9
-    input_pdf = f".{os.path.sep}dummy.pdf"
-    shutil.copy2(dummy_pdf, input_path := str(tmp_path / input_pdf))
-
-    shutil.copy2(dummy_pdf, input_path_2 := str(tmp_path / "dummy2.pdf"))
+    input_path, input_path_2 = make_dummy_pdfs(f".{os.path.sep}dummy.pdf", "dummy2.pdf")
 
     # add input_path twice to test how we handle duplicate input files
     stats_path = f"{tmp_path}/stats.csv"
@@ -40,9 +58,13 @@ def test_main_batch_compress(tmp_path: Path, capsys: CaptureFixture[str]) -> Non
     )
     assert ret_code == 0, f"expected main() exit code to be 0, got {ret_code}"
 
+    # duplicate paths and identical files are dropped before anything is uploaded
+    assert list(mock_ilovepdf.task_files.values()) == [[input_path]]
+
     # check stats file was written and has expected content
-    df_stats = pd.read_csv(stats_path)
-    assert list(df_stats) == [
+    with open(stats_path, newline="", encoding="utf8") as file:
+        header, *rows = csv.reader(file)
+    assert header == [
         "file",
         "original size (B)",
         "compressed size (B)",
@@ -50,41 +72,75 @@ def test_main_batch_compress(tmp_path: Path, capsys: CaptureFixture[str]) -> Non
         "size reduction (%)",
         "action",
     ]
-    assert df_stats.shape == (2, 6)
-    assert df_stats.file.tolist() == ["dummy.pdf", "dummy2.pdf"]
+    assert [len(row) for row in rows] == [6, 6]
+    assert [row[0] for row in rows] == ["dummy.pdf", "dummy2.pdf"]
 
     assert os.path.isfile(f"{tmp_path}/{compressed_pdf}")
 
     std_out, std_err = capsys.readouterr()
-    assert std_out == f"\n1 {expected_out}\n2 {expected_out.replace('dummy', 'dummy2')}"
+    assert std_out == expected_batch_out
     assert std_err == ""
 
 
-def test_main_in_place(capsys: CaptureFixture[str], tmp_path: Path) -> None:
+@pytest.mark.parametrize(
+    "extra_args", [[], ["--min-size-reduction", "0"]], ids=["default", "no-min-red"]
+)
+def test_main_in_place(
+    capsys: CaptureFixture[str],
+    dummy_pdf_path: str,
+    dummy_pdf_bytes: bytes,
+    extra_args: list[str],
+) -> None:
     """Test in-place main() invocation."""
-    input_pdf = shutil.copy2(dummy_pdf, tmp_path)
-
-    ret_code = main([input_pdf, "-i"])
+    ret_code = main([dummy_pdf_path, "-i", *extra_args])
     assert ret_code == 0, "main() should return 0 on success"
     std_out, std_err = capsys.readouterr()
-    if sys.platform == "darwin":
-        assert std_out == expected_out + "Old file moved to trash.\n"
-    else:
-        assert std_out == expected_out + "Old file deleted.\n"
+    assert std_out == expected_inplace_out
+    assert std_err == ""
+
+    # original was replaced by its compressed version
+    assert os.path.getsize(dummy_pdf_path) < len(dummy_pdf_bytes)
+
+
+def test_main_in_place_twice(capsys: CaptureFixture[str], dummy_pdf_path: str) -> None:
+    """Test compressing the same PDF in place twice. On macOS, this checks the
+    second original can be moved to the trash although the first one (same name) is
+    already there.
+    """
+    for _ in range(2):
+        assert main([dummy_pdf_path, "-i"]) == 0
+
+    std_out, std_err = capsys.readouterr()
+    assert std_out.startswith(expected_inplace_out)
     assert std_err == ""
 
-    # repeat same operation to test if original file (after 1st compression) can
-    # successfully be moved to trash (pdf-compressor should append file counter
-    # since a file by that name [the original input_pdf] already exists)
-    main([input_pdf, "-i"])
 
-    # test dropping minimum size reduction
-    main([input_pdf, "-i", "--min-size-reduction", "0"])
+@pytest.mark.parametrize("jobs", ["0", "-2", "two"])
+def test_main_invalid_jobs(capsys: CaptureFixture[str], jobs: str) -> None:
+    """Test --jobs is validated when parsing args, failing with a usage error."""
+    with pytest.raises(SystemExit) as exc_info:
+        main(["-j", jobs, "some.pdf"])
+
+    assert exc_info.value.code == 2
+    assert "must be a positive integer" in capsys.readouterr().err
+
+
+@pytest.mark.live_api
+def test_main_live_api(capsys: CaptureFixture[str], dummy_pdf_path: str) -> None:
+    """Test compressing a PDF with the real iLovePDF API."""
+    ret_code = main([dummy_pdf_path])
+    assert ret_code == 0, "main() should return 0 on success"
+
+    std_out, std_err = capsys.readouterr()
+    assert std_out == expected_out
+    assert std_err == ""
 
 
-def test_main_dir_glob(capsys: CaptureFixture[str], tmp_path: Path) -> None:
+def test_main_dir_glob(
+    capsys: CaptureFixture[str], tmp_path: Path, dummy_pdf_path: str
+) -> None:
     """Test passing a directory to make sure main() recursively globs for PDFs."""
-    input_pdf = shutil.copy2(dummy_pdf, tmp_path)
+    input_pdf = dummy_pdf_path
 
     ret_code = main([str(tmp_path), "-i", "--verbose"])
     assert ret_code == 0, "main() should return 0 on success"
@@ -95,6 +151,66 @@ def test_main_dir_glob(capsys: CaptureFixture[str], tmp_path: Path) -> None:
     assert std_err == ""
 
 
+def test_expand_dir(tmp_path: Path) -> None:
+    """Test directories are searched recursively for PDFs, skipping hidden files."""
+    for name in ("a.pdf", "B.PDF", "sub/c.pdfa", ".hidden/d.pdf", ".e.pdf", "f.txt"):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).touch()
+
+    pdf_paths = sorted(_expand_dir(str(tmp_path)))
+    expected = [str(tmp_path / name) for name in ("B.PDF", "a.pdf", "sub/c.pdfa")]
+    assert pdf_paths == expected
+
+    # non-directories are passed through unchanged, even if they're not PDFs
+    assert _expand_dir("not-a-dir.txt") == ["not-a-dir.txt"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs symlinks, trailing spaces")
+def test_expand_dir_symlinks_and_whitespace(tmp_path: Path) -> None:
+    """Test symlinked directories are followed (without looping forever) and PDF
+    names with trailing whitespace are found, like the glob this replaced.
+    """
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "a.pdf").touch()
+    (tmp_path / "docs" / "b.pdf ").touch()
+    (tmp_path / "root").mkdir()
+    (tmp_path / "root" / "linked").symlink_to(tmp_path / "docs")
+    (tmp_path / "docs" / "loop").symlink_to(tmp_path / "root")
+
+    pdf_paths = sorted(_expand_dir(str(tmp_path / "root")))
+    linked_dir = tmp_path / "root" / "linked"
+    assert pdf_paths == [str(linked_dir / "a.pdf"), str(linked_dir / "b.pdf ")]
+
+
+def test_main_dedupes_real_paths(
+    capsys: CaptureFixture[str],
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    dummy_pdf_path: str,
+) -> None:
+    """Test PDFs passed both directly and via their directory are only counted once."""
+    monkeypatch.chdir(tmp_path)
+
+    mock_compress = patch("pdf_compressor.main.Compress", side_effect=RuntimeError)
+    with mock_compress, pytest.raises(RuntimeError):
+        main([str(tmp_path), dummy_pdf_path, "dummy.pdf", "--verbose"])
+
+    std_out, _ = capsys.readouterr()
+    assert std_out == "PDFs to be compressed with iLovePDF: 1\n"
+
+
+def test_group_duplicates(tmp_path: Path) -> None:
+    """Test PDFs with identical content are grouped so each is uploaded only once."""
+    paths = [str(tmp_path / f"{name}.pdf") for name in "abcd"]
+    for path, content in zip(paths, (b"foo", b"bar", b"foo", b"baz")):
+        with open(path, "wb") as file:
+            file.write(content)
+
+    unique_paths, duplicates = _group_duplicates([*paths, "missing.pdf"])
+    assert unique_paths == [paths[0], paths[1], paths[3], "missing.pdf"]
+    assert duplicates == {paths[0]: [paths[2]]}
+
+
 def test_main_report_quota(capsys: CaptureFixture[str]) -> None:
     """Test CLI quota reporting."""
     main(["--report-quota"])
@@ -105,22 +221,37 @@ def test_main_report_quota(capsys: CaptureFixture[str]) -> None:
     assert std_err == ""
 
 
-def test_main_set_api_key() -> None:
+def test_main_set_api_key(tmp_path: Path) -> None:
     """Test CLI setting iLovePDF public API key."""
-    load_dotenv()
+    env_path = tmp_path / ".env"
+
+    # write .env to tmp_path so the repo's real .env is left untouched
+    with patch("pdf_compressor.main.ROOT", str(tmp_path)):
+        with pytest.raises(ValueError, match="invalid API key"):
+            main(["--set-api-key", "foo"])
+        assert not env_path.is_file()
+
+        main(["--set-api-key", "project_public_foobar"])
 
-    api_key = os.environ[API_KEY_KEY]  # save API key to reset it later
+    env_file = env_path.read_text(encoding="utf8")
+    assert env_file == f"{API_KEY_KEY}=project_public_foobar\n"
 
-    with pytest.raises(ValueError, match="invalid API key"):
-        main(["--set-api-key", "foo"])
 
-    main(["--set-api-key", "project_public_foobar"])
+def test_api_key_loads_dotenv_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test .env is only parsed on first API key lookup and missing keys raise."""
+    _load_dotenv_once.cache_clear()
+    monkeypatch.setenv(API_KEY_KEY, "project_public_foo")
 
-    load_dotenv()
+    with patch("pdf_compressor.main.load_dotenv") as mock_load_dotenv:
+        assert _api_key() == "project_public_foo"
+        assert _api_key() == "project_public_foo"
+        assert mock_load_dotenv.call_count == 1
 
-    assert os.environ[API_KEY_KEY] == "project_public_foobar"
+        monkeypatch.delenv(API_KEY_KEY)
+        with pytest.raises(KeyError, match="needs an iLovePDF public key"):
+            _api_key()
 
-    main(["--set-api-key", api_key])  # restore previous value
+    _load_dotenv_once.cache_clear()
 
 
 @pytest.mark.parametrize("arg", ["-v", "--version"])
@@ -131,7 +262,6 @@ def test_main_report_version(capsys: CaptureFixture[str], arg: str) -> None:
     assert exc_info.value.code == 0
 
     std_out, std_err = capsys.readouterr()
-    pkg_version = version(pkg_name := "pdf-compressor")
     assert std_out == f"{pkg_name} v{pkg_version}\n"
     assert std_err == ""
 
@@ -140,7 +270,7 @@ def test_main_bad_args() -> None:
     """Test bad CLI flags."""
     with pytest.raises(ValueError, match="Files must either be compressed in-place"):
         # empty suffix and no in-place flag are invalid
-        main(["--suffix", "", dummy_pdf])
+        main(["--suffix", "", "dummy.pdf"])
 
 
 def test_main_error_on_no_input_files() -> None:
@@ -180,27 +310,23 @@ def test_main_bad_files(capsys: CaptureFixture[str]) -> None:
 
 
 def test_main_password_outdir_flags(
-    capsys: pytest.CaptureFixture[str], tmp_path: Path
+    capsys: pytest.CaptureFixture[str],
+    tmp_path: Path,
+    make_dummy_pdfs: Callable[..., list[str]],
+    dummy_pdf_bytes: bytes,
 ) -> None:
     """Test the --password CLI flag and assert password in API payload."""
-    input_pdf1 = shutil.copy2(dummy_pdf, tmp_path / "test1.pdf")
-    input_pdf2 = shutil.copy2(dummy_pdf, tmp_path / "test2.pdf")
+    input_pdf1, input_pdf2 = make_dummy_pdfs("test1.pdf", "test2.pdf")
+    with open(input_pdf2, "ab") as file:  # identical PDFs would only be uploaded once
+        file.write(b"%% second file\n")
     test_password = "test123"  # noqa: S105
 
-    def mock_send_request(self, method, endpoint, payload=None, **kwargs) -> MagicMock:  # type: ignore[no-untyped-def] # noqa: ANN001, ANN003, ARG001
-        if method == "post" and endpoint == "process":
-            # Check that each file in the payload has the correct password
-            for idx in range(len(self.files)):
-                assert (
-                    payload[f"files[{idx}][password]"] == test_password
-                ), f"File {idx} does not have the correct password in the payload"
-
-        # Mock response for process endpoint
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
+    # build mock API responses once instead of on every request
+    response_content = json.dumps(
+        {
             "timer": "1",
             "status": "TaskSuccess",
-            "download_filename": "compressed.pdf",
+            "download_filename": "compressed.zip",
             "filesize": 1000,
             "output_filesize": 800,
             "output_filenumber": 2,
@@ -210,31 +336,56 @@ def test_main_password_outdir_flags(
             "task": "compress",
             "server_filename": "compressed.pdf",
         }
-        mock_response.content = b"Mocked response content"
-        # make tmp ZipFile at tmp_path/compressed.pdf
-        with ZipFile(tmp_path / "compressed.pdf", "w") as zip_file:
-            zip_file.write(input_pdf1, "test1.pdf")
-            zip_file.write(input_pdf2, "test2.pdf")
+    ).encode()
+    zip_buffer = io.BytesIO()
+    with ZipFile(zip_buffer, "w", compression=ZIP_STORED) as zip_file:
+        zip_file.writestr("0-test1-compress.pdf", dummy_pdf_bytes)
+        zip_file.writestr("1-test2-compress.pdf", dummy_pdf_bytes)
+    zip_bytes = zip_buffer.getvalue()
+
+    def mock_send_request(
+        self: Compress,
+        method: str,
+        endpoint: str,
+        json_payload: dict[str, Any] | None = None,
+        **kwargs: Any,  # noqa: ARG001
+    ) -> MagicMock:
+        if method == "post" and endpoint == "process":
+            assert json_payload is not None
+            # Check that each file in the payload has the correct password
+            for idx in range(len(self.files)):
+                assert (
+                    json_payload["files"][idx]["password"] == test_password
+                ), f"File {idx} does not have the correct password in the payload"
+
+        # same canned response for all endpoints, download streams the ZIP
+        mock_response = MagicMock(content=response_content)
+        mock_response.raw = io.BytesIO(zip_bytes)
 
         return mock_response
 
     with patch("pdf_compressor.Compress._send_request", new=mock_send_request):
-        # Convert PosixPath objects to strings
         ret_code = main(
             [
-                str(input_pdf1),
-                str(input_pdf2),
+                input_pdf1,
+                input_pdf2,
                 "--outdir",
                 str(tmp_path),
                 "--password",
                 test_password,
                 "--debug",  # to avoid calling del_or_keep_compressed()
+                "--write-stats-path",
+                str(tmp_path / "stats.csv"),
             ]
         )
 
         # Check that main() returned successfully
         assert ret_code == 0, "main() should return 0 on success"
 
+    # mock ZIP was downloaded to --outdir, debug runs have no stats to write
+    assert (tmp_path / "compressed.zip").read_bytes() == zip_bytes
+    assert not os.path.isfile(tmp_path / "stats.csv")
+
     # Check that no errors were printed
     stdout, stderr = capsys.readouterr()
     assert stderr == "", f"Unexpected error output: {stderr}"
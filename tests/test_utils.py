@@ -1,6 +1,21 @@
 from __future__ import annotations
 
-from pdf_compressor.utils import si_fmt
+import os
+from pathlib import Path
+from unittest.mock import patch
+from zipfile import ZIP_STORED, ZipFile
+
+import pandas as pd
+import pytest
+
+from pdf_compressor.utils import (
+    _move,
+    _move_to_trash,
+    del_or_keep_compressed,
+    load_dotenv,
+    si_fmt,
+    write_stats,
+)
 
 
 def test_si_fmt() -> None:
@@ -11,3 +26,204 @@ def test_si_fmt() -> None:
     assert si_fmt(0.00123, fmt=".3g", binary=False) == "1.23m"
 
     assert si_fmt(0.00000123, fmt="5.1f", sep=" ") == "  1.3 μ"
+
+
+@pytest.mark.parametrize(
+    ("val", "binary", "expected"),
+    [
+        (0, True, "0.0"),
+        (1, True, "1.0"),
+        (1023, True, "1023.0"),
+        (-999, False, "-999.0"),
+        (1024, True, "1.0K"),
+        (1000, False, "1.0K"),  # math.log(1000, 1000) < 1 due to float error
+        (-2048, True, "-2.0K"),
+        (1 / 1024, True, "1.0m"),
+        (1024**9, True, "1024.0Y"),  # no larger prefix than Yotta
+        (float("inf"), False, "inf"),
+        (float("-inf"), True, "-inf"),
+        (float("nan"), False, "nan"),
+    ],
+)
+def test_si_fmt_edge_cases(val: float, binary: bool, expected: str) -> None:  # noqa: FBT001
+    assert si_fmt(val, binary=binary) == expected
+
+
+def test_del_or_keep_compressed_duplicates(tmp_path: Path) -> None:
+    orig_paths = [str(tmp_path / name) for name in ("a.pdf", "sub/a.pdf")]
+    (tmp_path / "sub").mkdir()
+    for path in orig_paths:
+        Path(path).write_bytes(b"x" * 1000)
+    downloaded_file = str(tmp_path / "compressed.pdf")
+    Path(downloaded_file).write_bytes(b"x" * 100)
+
+    del_or_keep_compressed(
+        orig_paths[:1],
+        downloaded_file,
+        inplace=False,
+        suffix="-compressed",
+        min_size_reduction=10,
+        duplicates={orig_paths[0]: orig_paths[1:]},
+    )
+
+    # both identical inputs received the compressed file, no temp copies are left
+    for dir_path in (tmp_path, tmp_path / "sub"):
+        assert os.path.getsize(dir_path / "a-compressed.pdf") == 100
+    assert sorted(os.listdir(tmp_path)) == ["a-compressed.pdf", "a.pdf", "sub"]
+
+
+@pytest.mark.parametrize("inplace", [True, False])
+def test_del_or_keep_compressed_single_file_moved(
+    tmp_path: Path,
+    inplace: bool,  # noqa: FBT001
+) -> None:
+    orig_path = str(tmp_path / "a.pdf")
+    Path(orig_path).write_bytes(b"x" * 1000)
+    downloaded_file = str(tmp_path / "compressed.pdf")
+    Path(downloaded_file).write_bytes(b"x" * 100)
+
+    mock_save = patch("pdf_compressor.utils._save_compressed")
+    mock_platform = patch("sys.platform", "linux")  # no moving to trash
+    with mock_save as save_compressed, mock_platform:
+        del_or_keep_compressed(
+            [orig_path],
+            downloaded_file,
+            inplace=inplace,
+            suffix="-compressed",
+            min_size_reduction=10,
+        )
+
+    # lone compressed PDF is renamed to its destination, not copied
+    save_compressed.assert_not_called()
+    new_name = "a.pdf" if inplace else "a-compressed.pdf"
+    assert os.path.getsize(tmp_path / new_name) == 100
+    assert "compressed.pdf" not in os.listdir(tmp_path)
+
+
+def test_del_or_keep_compressed_zip(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    orig_paths = [str(tmp_path / name) for name in ("a.pdf", "b.pdf")]
+    for path in orig_paths:
+        Path(path).write_bytes(b"x" * 1000)
+    downloaded_file = str(tmp_path / "compressed.zip")
+    with ZipFile(downloaded_file, "w", compression=ZIP_STORED) as archive:
+        archive.writestr("0-a-compress.pdf", b"x" * 100)
+        archive.writestr("1-b-compress.pdf", b"x" * 995)  # not enough size reduction
+
+    # compressed PDFs are no longer extracted into the working directory
+    (tmp_path / "cwd").mkdir()
+    monkeypatch.chdir(tmp_path / "cwd")
+
+    stats = del_or_keep_compressed(
+        orig_paths,
+        downloaded_file,
+        inplace=False,
+        suffix="-compressed",
+        min_size_reduction=10,
+    )
+
+    assert [row["action"] for row in stats.values()] == [
+        "saved as a-compressed.pdf",
+        "kept original",
+    ]
+    assert os.path.getsize(tmp_path / "a-compressed.pdf") == 100
+    assert sorted(os.listdir(tmp_path)) == ["a-compressed.pdf", "a.pdf", "b.pdf", "cwd"]
+    assert os.listdir(tmp_path / "cwd") == []
+
+
+@pytest.mark.parametrize("ext", [".csv", ".json"])
+def test_write_stats_matches_pandas(tmp_path: Path, ext: str) -> None:
+    stats: dict[str, dict[str, object]] = {
+        name: {
+            "original size (B)": 1000,
+            "compressed size (B)": 800,
+            "size reduction (B)": 200,
+            "size reduction (%)": 0.2,
+            "action": action,
+        }
+        for name, action in (("a.pdf", "saved as a-c.pdf"), ("b,c.pdf", "kept"))
+    }
+    write_stats(stats, stats_path := str(tmp_path / f"stats{ext}"))
+
+    df_stats = pd.DataFrame(stats).T
+    df_stats.index.name = "file"
+    pd_path = str(tmp_path / f"pandas{ext}")
+    if ext == ".csv":
+        df_stats.to_csv(pd_path)
+    else:
+        df_stats.to_json(pd_path)
+
+    assert Path(stats_path).read_bytes() == Path(pd_path).read_bytes()
+
+
+def test_move_falls_back_to_shutil(tmp_path: Path) -> None:
+    src, dest = tmp_path / "src.pdf", tmp_path / "dest.pdf"
+    src.write_bytes(b"new")
+    dest.write_bytes(b"old")
+
+    _move(str(src), str(dest))  # existing dest is overwritten
+    assert dest.read_bytes() == b"new"
+    assert not src.exists()
+
+    # e.g. cross-device moves where rename fails
+    dest.rename(src)
+    with patch("os.replace", side_effect=OSError("cross-device link")):
+        _move(str(src), str(dest))
+    assert dest.read_bytes() == b"new"
+    assert not src.exists()
+
+
+def test_move_to_trash_overwrites(tmp_path: Path) -> None:
+    trash_dir = tmp_path / ".Trash"
+    trash_dir.mkdir()
+    (trash_dir / "doc.pdf").write_bytes(b"older")
+    (orig_path := tmp_path / "doc.pdf").write_bytes(b"old")
+
+    _move_to_trash(str(orig_path), str(trash_dir))
+
+    assert not orig_path.exists()
+    assert (trash_dir / "doc.pdf").read_bytes() == b"old"
+
+    # on PermissionError (seen on macOS), the file in the trash is deleted first
+    orig_path.write_bytes(b"new")
+    real_replace = os.replace
+
+    def replace_once_denied(src: str, dest: str) -> None:
+        if (trash_dir / "doc.pdf").exists():
+            raise PermissionError(1, "Operation not permitted")
+        real_replace(src, dest)
+
+    with patch("os.replace", side_effect=replace_once_denied):
+        _move_to_trash(str(orig_path), str(trash_dir))
+
+    assert not orig_path.exists()
+    assert (trash_dir / "doc.pdf").read_bytes() == b"new"
+
+
+@pytest.mark.parametrize(
+    ("content", "expected"),
+    [
+        (b"FOO_KEY=foo\n", {"FOO_KEY": "foo"}),
+        (b"FOO_KEY=a=b", {"FOO_KEY": "a=b"}),  # only split on first =
+        (b"# BAR_KEY=bar\n\nFOO_KEY=foo\n", {"FOO_KEY": "foo"}),
+        (b"  \nPATH\nFOO_KEY=foo\n", {"FOO_KEY": "foo"}),  # skip lines without =
+        (b"", {}),
+        (None, {}),  # missing .env is not an error
+    ],
+)
+def test_load_dotenv(
+    tmp_path: Path, content: bytes | None, expected: dict[str, str]
+) -> None:
+    dotenv_path = tmp_path / ".env"
+    if content is not None:
+        dotenv_path.write_bytes(content)
+
+    # os.environ is restored after each test by the _restore_environ fixture
+    for key in ("FOO_KEY", "BAR_KEY"):
+        os.environ.pop(key, None)
+    env_before = dict(os.environ)
+
+    load_dotenv(str(dotenv_path))
+
+    assert dict(os.environ.items() - env_before.items()) == expected